@@ -50,17 +50,20 @@ print_arguments(){
 }
 
 build_command(){
-  SUDO_PATH="/usr/bin/sudo"
-  COMMAND="/usr/sbin/addgroup"
+  # sudo is not needed (extra fork + exec) when the script is already started as root.
+  SUDO_PATH=()
+  if [[ ${EUID} -ne 0 ]]; then
+    SUDO_PATH=(/usr/bin/sudo)
+  fi
+  COMMAND=(/usr/sbin/addgroup)
 
-  FULL_COMMAND="${SUDO_PATH} ${COMMAND} ${GROUPNAME}"
-  echo "Full command: <<${FULL_COMMAND}>>"
+  FULL_COMMAND=("${SUDO_PATH[@]}" "${COMMAND[@]}" "${GROUPNAME}")
+  echo "Full command: <<${FULL_COMMAND[*]}>>"
 
 }
 
 execute_command(){
-  ${FULL_COMMAND}
-  exit 0
+  exec "${FULL_COMMAND[@]}"
 }
 
 read_arguments "$@"
@@ -63,21 +63,24 @@ print_arguments(){
 }
 
 build_command(){
-  SUDO_PATH="/usr/bin/sudo"
-  COMMAND="/usr/sbin/adduser --disabled-login --no-create-home --shell /sbin/nologin --quiet"
+  # sudo is not needed (extra fork + exec) when the script is already started as root.
+  SUDO_PATH=()
+  if [[ ${EUID} -ne 0 ]]; then
+    SUDO_PATH=(/usr/bin/sudo)
+  fi
+  COMMAND=(/usr/sbin/adduser --disabled-login --no-create-home --shell /sbin/nologin --quiet)
 
   if [ -n "${GROUP}" ]; then
-    COMMAND="${COMMAND} --ingroup ${GROUP}"
+    COMMAND+=(--ingroup "${GROUP}")
   fi
 
-  FULL_COMMAND="${SUDO_PATH} ${COMMAND} --gecos '${GECOS}' ${USERNAME}"
-  echo "Full command: <<${FULL_COMMAND}>>"
+  FULL_COMMAND=("${SUDO_PATH[@]}" "${COMMAND[@]}" --gecos "${GECOS}" "${USERNAME}")
+  echo "Full command: <<${FULL_COMMAND[*]}>>"
 
 }
 
 execute_command(){
-  eval "${FULL_COMMAND}"
-  exit 0
+  exec "${FULL_COMMAND[@]}"
 }
 
 read_arguments "$@"
@@ -60,14 +60,18 @@ print_arguments(){
 }
 
 build_command(){
-  SUDO_PATH="/usr/bin/sudo"
-  ID_COMMAND="/usr/bin/id -Gn ${USERNAME}"
-  GREP_COMMAND="grep -c ${GROUPNAME}"
-  FULL_COMMAND="${SUDO_PATH} ${ID_COMMAND} | ${GREP_COMMAND}"
+  # sudo is not needed (extra fork + exec) when the script is already started as root.
+  SUDO_PATH=()
+  if [[ ${EUID} -ne 0 ]]; then
+    SUDO_PATH=(/usr/bin/sudo)
+  fi
+  ID_COMMAND=("${SUDO_PATH[@]}" /usr/bin/id -Gn "${USERNAME}")
+  GREP_COMMAND=(grep -c "${GROUPNAME}")
 }
 
 execute_command(){
-  eval "${FULL_COMMAND}"
+  "${ID_COMMAND[@]}" | "${GREP_COMMAND[@]}"
+  # Always 0: grep -c exits 1 when there are no matches, the printed count is the result.
   exit 0
 }
 
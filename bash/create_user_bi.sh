@@ -0,0 +1,113 @@
+#!/bin/bash
+# bi == Broker Interface
+# Script should be at /usr/sbin, like /usr/sbin/create_user_bi.sh and added to sudoers.
+# Creates a user and sets a password in a single call (adduser_bi.sh + set_pass_bi.sh).
+# Example of usage: create_user_bi.sh -u tmp_user -p new_pass -G 'Full user name,,,Vdi-broker' -g vdi-broker-users
+
+read_arguments(){
+  # read user passed arguments
+  USAGE="$(basename "$0") -u user1, --username user1  -p new_pass, --password new_pass | -s, --stdin [-g existing_group, --group existing_group] [-G GECOS_STR, --gecos GECOS_STR] [-h, --help]"
+
+  UNKNOWN=()
+  USERNAME=""
+  PASSWORD=""
+  GECOS=""
+
+  while [[ $# -gt 0 ]]
+  do
+    KEY="$1"
+    case ${KEY} in
+        -u|--username)
+        USERNAME="$2"
+        shift # past argument
+        shift # past value
+        ;;
+        -p|--password)
+        PASSWORD="$2"
+        shift # past argument
+        shift # past value
+        ;;
+        -s|--stdin)
+        IFS= read -r PASSWORD # password from stdin is not visible in the process list
+        shift # past argument
+        ;;
+        -g|--group)
+        GROUP="$2"
+        shift # past argument
+        shift # past value
+        ;;
+        -G|--GECOS)
+        GECOS="$2"
+        shift # past argument
+        shift # past value
+        ;;
+        -h|--help)
+        echo "${USAGE}"
+        exit 0
+        ;;
+        *)    # unknown option
+          UNKNOWN+=("$1") # save it in an array for later
+        shift # past argument
+        ;;
+    esac
+  done
+  if [ -n "${UNKNOWN}" ]; then
+    echo "${USAGE}"
+    print_arguments
+    echo "Unknown arguments: ${UNKNOWN}" >&2
+    exit 1
+  fi
+
+  if [ -z "${USERNAME}" ]; then
+    echo "${USAGE}"
+    print_arguments
+    echo "Username can't be empty." >&2
+    exit 1
+  fi
+
+  if [ -z "${PASSWORD}" ]; then
+    echo "${USAGE}"
+    print_arguments
+    echo "Password can't be empty." >&2
+    exit 1
+  fi
+
+}
+
+print_arguments(){
+  echo "user argument is: <<${USERNAME}>>"
+  echo "group argument is: <<${GROUP}>>"
+  echo "gecos argument is: <<${GECOS}>>"
+}
+
+build_command(){
+  # sudo is not needed (extra fork + exec) when the script is already started as root.
+  SUDO_PATH=()
+  if [[ ${EUID} -ne 0 ]]; then
+    SUDO_PATH=(/usr/bin/sudo)
+  fi
+  COMMAND=(/usr/sbin/adduser --disabled-login --no-create-home --shell /sbin/nologin --quiet)
+
+  if [ -n "${GROUP}" ]; then
+    COMMAND+=(--ingroup "${GROUP}")
+  fi
+
+  FULL_COMMAND=("${SUDO_PATH[@]}" "${COMMAND[@]}" --gecos "${GECOS}" "${USERNAME}")
+  echo "Full command: <<${FULL_COMMAND[*]}>>"
+
+  PASS_COMMAND=("${SUDO_PATH[@]}" /usr/sbin/chpasswd)
+
+}
+
+execute_command(){
+  "${FULL_COMMAND[@]}" || exit $?
+  # 96 - user is created, but password is not set (VeilAuthPam returns 969).
+  echo "${USERNAME}:${PASSWORD}" | "${PASS_COMMAND[@]}" || exit 96
+  exit 0
+}
+
+read_arguments "$@"
+
+build_command
+
+execute_command
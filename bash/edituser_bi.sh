@@ -46,16 +46,12 @@ read_arguments(){
         shift # past value
         ;;
         -L)
-        LOCK="$2"
-        shift # past argument
-        shift # past value
         LOCK=YES
+        shift # past argument
         ;;
         -U)
-        UNLOCK="$2"
-        shift # past argument
-        shift # past value
         UNLOCK=YES
+        shift # past argument
         ;;
         -h|--help)
         echo "${USAGE}"
@@ -93,41 +89,44 @@ print_arguments(){
 
 build_command(){
 
-  SUDO_PATH="/usr/bin/sudo"
-  COMMAND="/usr/sbin/usermod"
+  # sudo is not needed (extra fork + exec) when the script is already started as root.
+  SUDO_PATH=()
+  if [[ ${EUID} -ne 0 ]]; then
+    SUDO_PATH=(/usr/bin/sudo)
+  fi
+  COMMAND=(/usr/sbin/usermod)
 
   if [ -n "${COMMENT}" ]; then
-    COMMAND="${COMMAND} --comment ${COMMENT}"
+    COMMAND+=(--comment "${COMMENT}")
   fi
 
   if [ -n "${EXPIRE_DATE}" ]; then
-    COMMAND="${COMMAND} --expiredate ${EXPIRE_DATE}"
+    COMMAND+=(--expiredate "${EXPIRE_DATE}")
   fi
 
   if [ -n "${INACTIVE_PERIOD}" ]; then
-    COMMAND="${COMMAND} --inactive ${INACTIVE_PERIOD}"
+    COMMAND+=(--inactive "${INACTIVE_PERIOD}")
   fi
 
   if [ ${LOCK} == YES ]; then
-    COMMAND="${COMMAND} --lock"
+    COMMAND+=(--lock)
   fi
 
   if [ ${UNLOCK} == YES ]; then
-    COMMAND="${COMMAND} --unlock"
+    COMMAND+=(--unlock)
   fi
 
   if [ -n "${GROUPNAME}" ]; then
-    COMMAND="${COMMAND} --append --groups ${GROUPNAME}"
+    COMMAND+=(--append --groups "${GROUPNAME}")
   fi
 
-  FULL_COMMAND="${SUDO_PATH} ${COMMAND} ${USERNAME}"
-  echo "Full command: <<${FULL_COMMAND}>>"
+  FULL_COMMAND=("${SUDO_PATH[@]}" "${COMMAND[@]}" "${USERNAME}")
+  echo "Full command: <<${FULL_COMMAND[*]}>>"
 
 }
 
 execute_command(){
-  ${FULL_COMMAND}
-  exit 0
+  exec "${FULL_COMMAND[@]}"
 }
 
 read_arguments "$@"
@@ -1,11 +1,11 @@
 #!/bin/bash
 # bi == Broker Interface
 # Script should be at /usr/sbin, like /usr/sbin/kill_proc_bi.sh and added to sudoers.
-# Example of usage: kill_proc_bi.sh -p 123
+# Example of usage: kill_proc_bi.sh -p 123 (or kill_proc_bi.sh 123, like kill)
 
 read_arguments(){
   # read user passed arguments
-  USAGE="$(basename "$0") -p 123, --pid 123 [-h, --help]"
+  USAGE="$(basename "$0") -p 123, --pid 123, 123 [-h, --help]"
 
   UNKNOWN=()
   PROC_PID=""
@@ -23,6 +23,10 @@ read_arguments(){
         echo "${USAGE}"
         exit 0
         ;;
+        [0-9]*)    # bare pid, VeilAuthPam calls kill_cmd like kill
+        PROC_PID="$1"
+        shift # past argument
+        ;;
         *)    # unknown option
           UNKNOWN+=("$1") # save it in an array for later
         shift # past argument
@@ -50,17 +54,20 @@ print_arguments(){
 }
 
 build_command(){
-  SUDO_PATH="/usr/bin/sudo"
-  COMMAND="/usr/bin/kill"
+  # sudo is not needed (extra fork + exec) when the script is already started as root.
+  SUDO_PATH=()
+  if [[ ${EUID} -ne 0 ]]; then
+    SUDO_PATH=(/usr/bin/sudo)
+  fi
+  COMMAND=(/usr/bin/kill)
 
-  FULL_COMMAND="${SUDO_PATH} ${COMMAND} ${PROC_PID}"
-  echo "Full command: <<${FULL_COMMAND}>>"
+  FULL_COMMAND=("${SUDO_PATH[@]}" "${COMMAND[@]}" "${PROC_PID}")
+  echo "Full command: <<${FULL_COMMAND[*]}>>"
 
 }
 
 execute_command(){
-  ${FULL_COMMAND}
-  exit 0
+  exec "${FULL_COMMAND[@]}"
 }
 
 read_arguments "$@"
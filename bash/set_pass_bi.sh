@@ -2,10 +2,11 @@
 # bi == Broker Interface
 # Script should be at /usr/sbin, like /usr/sbin/set_pass_bi.sh and added to sudoers.
 # Example of usage: set_pass_bi.sh -u tmp_user -p new_pass
+# or: echo new_pass | set_pass_bi.sh -u tmp_user -s
 
 read_arguments(){
   # read user passed arguments
-  USAGE="$(basename "$0") -u user1, --username user1  -p new_pass, --password new_pass [-h, --help]"
+  USAGE="$(basename "$0") -u user1, --username user1  -p new_pass, --password new_pass | -s, --stdin [-h, --help]"
 
   UNKNOWN=()
   USERNAME=""
@@ -25,6 +26,10 @@ read_arguments(){
         shift # past argument
         shift # past value
         ;;
+        -s|--stdin)
+        IFS= read -r PASSWORD # password from stdin is not visible in the process list
+        shift # past argument
+        ;;
         -h|--help)
         echo "${USAGE}"
         exit 0
@@ -55,14 +60,17 @@ read_arguments(){
 }
 
 build_command(){
-  SUDO_PATH="/usr/bin/sudo"
-  COMMAND="/usr/sbin/chpasswd"
-  FULL_COMMAND="echo ${USERNAME}:${PASSWORD} | ${SUDO_PATH} ${COMMAND}"
+  # sudo is not needed (extra fork + exec) when the script is already started as root.
+  SUDO_PATH=()
+  if [[ ${EUID} -ne 0 ]]; then
+    SUDO_PATH=(/usr/bin/sudo)
+  fi
+  COMMAND=("${SUDO_PATH[@]}" /usr/sbin/chpasswd)
 }
 
 execute_command(){
-  eval "${FULL_COMMAND}"
-  exit 0
+  echo "${USERNAME}:${PASSWORD}" | "${COMMAND[@]}"
+  exit "${PIPESTATUS[1]}"
 }
 
 read_arguments "$@"
@@ -20,7 +20,7 @@ async def simple_main():
     # create_result = await auth_class.user_create_new(username='user', password='qwe123')
     # >>> return code: 0, msg: None
     # create_result = await auth_class.user_create_new(username='user; /bin/rm -rf /home/devalv/tmp', password='peka')
-    # >>> return code: 1, msg: Unknown arguments: /bin/rm
+    # >>> ValueError: Unsafe command argument at position 1.
     # check_in_group_result = await auth_class.user_in_group(username='devalv', group='vdi-web-admin')
     # >>> True
     # Disable as_sudo class attr for user_create_new cmd.
@@ -22,5 +22,6 @@ setuptools.setup(
         'Operating System :: POSIX :: Linux',
     ],
     python_requires='>=3.5',
-    install_requires=['python-pam==1.8.*', ]
+    install_requires=['python-pam==1.8.*', ],
+    extras_require={'timeout': ['async-timeout>=3.0.1', ]}
 )
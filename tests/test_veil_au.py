@@ -0,0 +1,492 @@
+# -*- coding: utf-8 -*-
+"""VeilAuthPam tests with temporary executable scripts instead of bi-scripts."""
+
+import asyncio
+import grp
+import os
+import pwd
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from veil_aio_au import VeilAuthPam, VeilResult, veil_au
+
+pytestmark = pytest.mark.base
+
+# Saves arguments (one per line) near the script.
+RECORD_SCRIPT = """
+printf '%s\\n' "$@" > "$0.args"
+"""
+# user_create_new_cmd: -u nopass - user is created, but password is not set.
+CREATE_NEW_SCRIPT = """
+printf '%s\\n' "$@" > "$0.args"
+case "$2" in
+  nopass) exit 96 ;;
+esac
+"""
+# Counts calls and prints a prepared grep -c result like check_in_group_bi.sh.
+CHECK_SCRIPT = """
+echo call >> "$0.calls"
+cat "$0.state"
+"""
+
+
+class FakePam:
+    """pam.pam() replacement, authentication of the `slow` user takes 1 sec."""
+
+    created = 0
+
+    def __init__(self):
+        """Count created objects."""
+        FakePam.created += 1
+        self.code = None
+        self.reason = None
+
+    def authenticate(self, username: str, password: str) -> bool:
+        """Accept the `qwe123` password only."""
+        if username == 'slow':
+            time.sleep(1)
+        result = password == 'qwe123'
+        self.code, self.reason = (0, 'Success') if result else (7, 'Authentication failure')
+        return result
+
+
+def make_script(directory, name: str, body: str) -> str:
+    """Create an executable bash script and return its path."""
+    path = directory / name
+    path.write_text('#!/bin/bash\n' + body)
+    path.chmod(0o755)
+    return str(path)
+
+
+def read_lines(path: str) -> list:
+    """Read recorded script output."""
+    with open(path) as recorded:
+        return recorded.read().splitlines()
+
+
+@pytest.fixture
+def scripts(tmp_path) -> dict:
+    """Paths of the temporary scripts."""
+    script_paths = {name: make_script(tmp_path, name + '.sh', RECORD_SCRIPT)
+                    for name in ('user_add', 'group_add', 'user_edit', 'set_pass',
+                                 'remove_group')}
+    script_paths['check'] = make_script(tmp_path, 'check.sh', CHECK_SCRIPT)
+    script_paths['create_new'] = make_script(tmp_path, 'create_new.sh', CREATE_NEW_SCRIPT)
+    set_group_check(script_paths, '1')
+    return script_paths
+
+
+def set_group_check(script_paths: dict, count: str):
+    """Set the check script output."""
+    with open(script_paths['check'] + '.state', 'w') as state:
+        state.write(count + '\n')
+
+
+def group_check_calls(script_paths: dict) -> int:
+    """Count check script calls."""
+    if not os.path.exists(script_paths['check'] + '.calls'):
+        return 0
+    return len(read_lines(script_paths['check'] + '.calls'))
+
+
+def make_auth_class(script_paths: dict, **kwargs) -> VeilAuthPam:
+    """Create VeilAuthPam with the temporary scripts (group check by the check script)."""
+    kwargs.setdefault('nss_group_check', False)
+    return VeilAuthPam(user_add_cmd=script_paths['user_add'],
+                       group_add_cmd=script_paths['group_add'],
+                       user_edit_cmd=script_paths['user_edit'],
+                       user_set_pass_cmd=script_paths['set_pass'],
+                       user_check_in_group_cmd=script_paths['check'],
+                       user_remove_group_cmd=script_paths['remove_group'],
+                       **kwargs)
+
+
+@pytest.fixture
+def auth_class(scripts):
+    """Create VeilAuthPam with the temporary scripts and default settings."""
+    return make_auth_class(scripts)
+
+
+@pytest.mark.asyncio
+async def test_user_in_group_cache(auth_class, scripts):
+    """Check result is cached until the group of the user is changed."""
+    assert await auth_class.user_in_group(username='user', group='vdi')
+    assert await auth_class.user_in_group(username='user', group='vdi')
+    assert group_check_calls(scripts) == 1
+
+    set_group_check(scripts, '0')
+    assert (await auth_class.user_remove_group(username='user', group='vdi')).success
+    assert not await auth_class.user_in_group(username='user', group='vdi')
+    assert group_check_calls(scripts) == 2
+
+    set_group_check(scripts, '1')
+    assert (await auth_class.user_add_group(username='user', group='vdi')).success
+    assert await auth_class.user_in_group(username='user', group='vdi')
+    assert group_check_calls(scripts) == 3
+
+
+@pytest.mark.asyncio
+async def test_user_create_drops_cached_membership(auth_class, scripts):
+    """False cached before the user creation is not returned after it."""
+    set_group_check(scripts, '0')
+    assert not await auth_class.user_in_group(username='user', group='vdi')
+    set_group_check(scripts, '1')
+    assert (await auth_class.user_create(username='user', group='vdi')).success
+    assert await auth_class.user_in_group(username='user', group='vdi')
+    assert group_check_calls(scripts) == 2
+
+
+@pytest.mark.asyncio
+async def test_user_in_group_without_cache(scripts):
+    """group_cache_ttl=0 disables the cache."""
+    veil_auth = make_auth_class(scripts, group_cache_ttl=0)
+    assert await veil_auth.user_in_group(username='user', group='vdi')
+    assert await veil_auth.user_in_group(username='user', group='vdi')
+    assert group_check_calls(scripts) == 2
+
+
+@pytest.mark.asyncio
+async def test_user_authenticate(scripts, monkeypatch):
+    """Pool thread reuses its pam object, timed out authentication returns code 1."""
+    monkeypatch.setattr(veil_au, 'pam', SimpleNamespace(pam=FakePam))
+    monkeypatch.setattr(FakePam, 'created', 0)
+    veil_auth = make_auth_class(scripts, pam_workers=1, task_timeout=0.5)
+    success = await veil_auth.user_authenticate(username='user', password='qwe123')
+    failure = await veil_auth.user_authenticate(username='user', password='qwe')
+    timeout = await veil_auth.user_authenticate(username='slow', password='qwe123')
+    veil_auth.close()
+    assert (success.return_code, success.stdout_msg) == (0, 'Success')
+    assert (failure.return_code, failure.error_msg) == (7, 'Authentication failure')
+    assert (timeout.return_code, timeout.error_msg) == (1, 'Authentication timeout.')
+    assert FakePam.created == 1
+
+
+@pytest.mark.asyncio
+async def test_not_configured_command_denied(auth_class, tmp_path):
+    """Only the configured commands can be executed."""
+    other_cmd = make_script(tmp_path, 'other.sh', RECORD_SCRIPT)
+    with pytest.raises(ValueError) as exc_info:
+        await auth_class._VeilAuthPam__run_cmd(cmd=other_cmd, cmd_args=['-u', 'user'])
+    assert 'execution denied' in str(exc_info.value)
+    assert not os.path.exists(other_cmd + '.args')
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('username, group', [('user; rm -rf /', None),
+                                             ('root:x', None),
+                                             ('-o', None),
+                                             ('user', 'vdi,sudo'),
+                                             ('user', 'vdi sudo')])
+async def test_unsafe_name_rejected(auth_class, scripts, username, group):
+    """Names with separators of the downstream tools are rejected before the command start."""
+    with pytest.raises(ValueError) as exc_info:
+        await auth_class.user_create(username=username, group=group)
+    assert 'Unsafe command argument at position' in str(exc_info.value)
+    assert not os.path.exists(scripts['user_add'] + '.args')
+
+
+@pytest.mark.asyncio
+async def test_root_password_injection_rejected(auth_class, scripts):
+    """`root:owned` would make chpasswd set the root password."""
+    with pytest.raises(ValueError):
+        await auth_class.user_set_password(username='root:owned', new_password='x')
+    assert not os.path.exists(scripts['set_pass'] + '.args')
+
+
+@pytest.mark.asyncio
+async def test_group_list_injection_rejected(auth_class, scripts):
+    """`vdi,sudo` would make usermod --append --groups add the sudo group."""
+    with pytest.raises(ValueError):
+        await auth_class.user_add_group(username='user', group='vdi,sudo')
+    assert not os.path.exists(scripts['user_edit'] + '.args')
+
+
+@pytest.mark.asyncio
+async def test_gecos_argument_accepted(auth_class, scripts):
+    """GECOS keeps commas, spaces and non-ASCII letters."""
+    result = await auth_class.user_create(username='user', group='vdi-users',
+                                          gecos='Фамилия Имя,,,Vdi-broker')
+    assert result.success
+    assert read_lines(scripts['user_add'] + '.args') == ['-u', 'user', '-g', 'vdi-users',
+                                                         '-G', 'Фамилия Имя,,,Vdi-broker']
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('password', ['P@ss!word#1', 'pa$$w0rd', 'Abc_123%', 'a b;c:d'])
+async def test_password_argument_accepted(auth_class, scripts, password):
+    """Passwords are not checked against the names pattern."""
+    result = await auth_class.user_set_password(username='user', new_password=password)
+    assert result.success
+    assert read_lines(scripts['set_pass'] + '.args') == ['-u', 'user', '-p', password]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('password', ['', 'secret\nline'])
+async def test_password_argument_rejected(auth_class, password):
+    """Empty or multiline password is rejected, the error does not contain it."""
+    with pytest.raises(ValueError) as exc_info:
+        await auth_class.user_set_password(username='user', new_password=password)
+    assert 'secret' not in str(exc_info.value)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('kwargs', [{'expire_date': '2021-01-01; id'},
+                                    {'expire_date': '01.01.2021'},
+                                    {'inactive_period': -5}])
+async def test_user_edit_values_rejected(auth_class, kwargs):
+    """Expire date and inactive period have their own patterns."""
+    with pytest.raises(ValueError):
+        await auth_class._user_edit(username='user', **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_user_create_new_single_call(scripts):
+    """user_create_new_cmd creates a user with a password by one call."""
+    veil_auth = make_auth_class(scripts, user_create_new_cmd=scripts['create_new'])
+    result = await veil_auth.user_create_new(username='user', password='qwe123', group='vdi')
+    assert result.success
+    assert read_lines(scripts['create_new'] + '.args') == ['-u', 'user', '-p', 'qwe123',
+                                                           '-g', 'vdi']
+    assert not os.path.exists(scripts['user_add'] + '.args')
+    assert not os.path.exists(scripts['set_pass'] + '.args')
+
+
+@pytest.mark.asyncio
+async def test_user_create_new_password_not_set(scripts):
+    """Return code 96 of user_create_new_cmd is returned as 969."""
+    veil_auth = make_auth_class(scripts, user_create_new_cmd=scripts['create_new'])
+    result = await veil_auth.user_create_new(username='nopass', password='qwe123')
+    assert result.return_code == 969
+
+
+@pytest.mark.asyncio
+async def test_user_in_group_ignores_stderr(scripts, tmp_path):
+    """Group check result is read from stdout only."""
+    scripts['check'] = make_script(tmp_path, 'noisy_check.sh', 'echo warning >&2\necho 1\n')
+    veil_auth = make_auth_class(scripts)
+    assert await veil_auth.user_in_group(username='user', group='vdi')
+
+
+@pytest.mark.asyncio
+async def test_command_timeout(scripts, tmp_path):
+    """Timed out command is killed and returns code 1."""
+    scripts['user_add'] = make_script(tmp_path, 'slow.sh', 'exec sleep 30\n')
+    veil_auth = make_auth_class(scripts, task_timeout=0.5)
+    started = time.monotonic()
+    result = await veil_auth.user_create(username='user')
+    assert result.return_code == 1
+    assert time.monotonic() - started < 5
+
+
+@pytest.mark.asyncio
+async def test_shared_result_read_only(auth_class):
+    """Silent successful result is shared and can not be changed by a caller."""
+    result = await auth_class.user_create(username='user')
+    assert result is veil_au._OK_RESULT
+    with pytest.raises(AttributeError):
+        result.return_code = 1
+    with pytest.raises(AttributeError):
+        result.error_msg = 'error'
+    assert (await auth_class.user_create(username='other')).success
+
+
+def test_result_decoded_on_access():
+    """Raw bytes are returned as str, str values are kept."""
+    result = VeilResult(return_code=1, error_msg=b'error', stdout_msg='out')
+    assert not result.success
+    assert (result.error_msg, result.stdout_msg) == ('error', 'out')
+    assert VeilResult(return_code=0, error_msg=b'', stdout_msg=None).error_msg is None
+
+
+def test_validate_cmd_path(tmp_path):
+    """Only user executable files are accepted, successful checks are cached."""
+    with pytest.raises(FileExistsError):
+        veil_au._validate_cmd_path(str(tmp_path))
+    with pytest.raises(FileExistsError):
+        veil_au._validate_cmd_path(str(tmp_path / 'missing.sh'))
+    path = tmp_path / 'not_executable.sh'
+    path.write_text('#!/bin/bash\n')
+    with pytest.raises(PermissionError):
+        veil_au._validate_cmd_path(str(path))
+    path.chmod(0o755)
+    assert veil_au._validate_cmd_path(str(path)) == str(path)
+    hits = veil_au._validate_cmd_path.cache_info().hits
+    path.chmod(0o644)
+    assert veil_au._validate_cmd_path(str(path)) == str(path)
+    assert veil_au._validate_cmd_path.cache_info().hits == hits + 1
+
+
+@pytest.mark.asyncio
+async def test_user_lock_unlock_arguments(auth_class, scripts):
+    """Lock flags are passed without values."""
+    assert (await auth_class.user_lock(username='user')).success
+    assert read_lines(scripts['user_edit'] + '.args') == ['-u', 'user', '-L']
+    assert (await auth_class.user_unlock(username='user')).success
+    assert read_lines(scripts['user_edit'] + '.args') == ['-u', 'user', '-U']
+
+
+@pytest.mark.asyncio
+async def test_users_create_new(scripts, tmp_path):
+    """Results are in the users order, failed password set returns 969."""
+    scripts['set_pass'] = make_script(tmp_path, 'failing_set_pass.sh',
+                                      '[ "$2" = nopass ] && exit 3\nexit 0\n')
+    auth_class = make_auth_class(scripts)
+    results = await auth_class.users_create_new([
+        {'username': 'user1', 'password': 'qwe123', 'group': 'vdi'},
+        {'username': 'bad:name', 'password': 'secret1'},
+        {'username': 'nopass', 'password': 'qwe123', 'gecos': 'Name'}], max_concurrency=2)
+    assert results[0].success
+    assert isinstance(results[1], ValueError)
+    assert 'secret1' not in str(results[1])
+    assert results[2].return_code == 969
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('max_concurrency', [0, -1, None])
+async def test_users_create_new_bad_concurrency(auth_class, max_concurrency):
+    """Not positive max_concurrency is rejected instead of waiting forever."""
+    with pytest.raises(ValueError):
+        await auth_class.users_create_new([{'username': 'user1', 'password': 'qwe123'}],
+                                          max_concurrency=max_concurrency)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('show_stdout', [False, True])
+async def test_command_output(scripts, tmp_path, show_stdout):
+    """Stderr makes the result failed, stdout is read only with show_stdout."""
+    scripts['user_add'] = make_script(tmp_path, 'noisy.sh', 'echo out\necho error >&2\n')
+    veil_auth = make_auth_class(scripts, show_stdout=show_stdout)
+    result = await veil_auth.user_create(username='user')
+    assert (result.return_code, result.error_msg) == (1, 'error\n')
+    assert result.stdout_msg == ('out\n' if show_stdout else None)
+
+
+def test_allowed_commands(scripts):
+    """All defined commands are allowed, not defined ones are skipped."""
+    veil_auth = make_auth_class(scripts, user_create_new_cmd=scripts['create_new'])
+    allowed_cmds = veil_auth._VeilAuthPam__allowed_cmds
+    assert scripts['create_new'] in allowed_cmds
+    assert None not in allowed_cmds
+    assert None not in make_auth_class(scripts)._VeilAuthPam__allowed_cmds
+
+
+@pytest.mark.asyncio
+async def test_password_stdin(scripts, tmp_path):
+    """With password_stdin the password is not in argv."""
+    body = RECORD_SCRIPT + 'cat > "$0.stdin"\n'
+    scripts['set_pass'] = make_script(tmp_path, 'stdin_set_pass.sh', body)
+    create_new = make_script(tmp_path, 'stdin_create_new.sh', body)
+    veil_auth = make_auth_class(scripts, user_create_new_cmd=create_new, password_stdin=True)
+    assert (await veil_auth.user_set_password(username='user', new_password='a b:c')).success
+    assert read_lines(scripts['set_pass'] + '.args') == ['-u', 'user', '-s']
+    assert read_lines(scripts['set_pass'] + '.stdin') == ['a b:c']
+    assert (await veil_auth.user_create_new(username='user', password='qwe123',
+                                            group='vdi')).success
+    assert read_lines(create_new + '.args') == ['-u', 'user', '-s', '-g', 'vdi']
+    assert read_lines(create_new + '.stdin') == ['qwe123']
+    with pytest.raises(ValueError):
+        await veil_auth.user_set_password(username='user', new_password='secret\nline')
+
+
+def test_sudo_without_kill_rejected(scripts):
+    """sudo_cmd without kill_cmd is rejected when the object is created."""
+    with pytest.raises(AssertionError):
+        make_auth_class(scripts, sudo_cmd=scripts['user_add'])
+
+
+def make_sudo_auth_class(scripts: dict, tmp_path, slow_body: str) -> VeilAuthPam:
+    """Create VeilAuthPam with a fake sudo, a recording kill and a slow user_add_cmd."""
+    scripts['user_add'] = make_script(tmp_path, 'slow.sh', slow_body)
+    sudo_cmd = make_script(tmp_path, 'sudo.sh', 'exec "$@"\n')
+    kill_cmd = make_script(tmp_path, 'kill.sh', RECORD_SCRIPT + 'exec kill "$@"\n')
+    return make_auth_class(scripts, sudo_cmd=sudo_cmd, kill_cmd=kill_cmd, task_timeout=0.5)
+
+
+@pytest.mark.asyncio
+async def test_sudo_command_timeout(scripts, tmp_path):
+    """Timed out command under sudo is terminated without kill_cmd."""
+    veil_auth = make_sudo_auth_class(scripts, tmp_path, 'exec sleep 30\n')
+    started = time.monotonic()
+    assert (await veil_auth.user_create(username='user')).return_code == 1
+    assert time.monotonic() - started < 5
+    assert not os.path.exists(str(tmp_path / 'kill.sh.args'))
+
+
+@pytest.mark.asyncio
+async def test_sudo_command_ignores_sigterm(scripts, tmp_path, monkeypatch):
+    """Command that ignores SIGTERM is killed, the usual timeout result is returned."""
+    monkeypatch.setattr(veil_au, '_STOP_TIMEOUT', 0.5)
+    veil_auth = make_sudo_auth_class(scripts, tmp_path, "trap '' TERM\nexec sleep 30\n")
+    started = time.monotonic()
+    assert (await veil_auth.user_create(username='user')).return_code == 1
+    # task_timeout + _STOP_TIMEOUT after SIGTERM
+    assert 0.9 < time.monotonic() - started < 5
+
+
+@pytest.mark.asyncio
+async def test_sudo_command_kill_cmd(scripts, tmp_path, monkeypatch):
+    """kill_cmd is called if the sudo process can`t be signalled directly."""
+    def not_permitted(proc):
+        raise PermissionError
+
+    monkeypatch.setattr(asyncio.subprocess.Process, 'terminate', not_permitted)
+    veil_auth = make_sudo_auth_class(scripts, tmp_path, 'exec sleep 30\n')
+    assert (await veil_auth.user_create(username='user')).return_code == 1
+    assert len(read_lines(str(tmp_path / 'kill.sh.args'))) == 1
+
+
+def test_optional_commands(scripts):
+    """Empty optional command is stored as None, empty required command is rejected."""
+    veil_auth = make_auth_class(scripts, sudo_cmd='', kill_cmd=None, user_create_new_cmd='')
+    assert veil_auth._VeilAuthPam__SUDO_CMD is None
+    assert veil_auth._VeilAuthPam__USER_CREATE_NEW_CMD is None
+    assert not veil_auth.as_sudo
+    scripts['user_add'] = None
+    with pytest.raises(TypeError):
+        make_auth_class(scripts)
+
+
+@pytest.mark.asyncio
+async def test_exit_code_without_stderr(scripts, tmp_path):
+    """With capture_stderr=False failure is reported by the exit code."""
+    scripts['user_edit'] = make_script(tmp_path, 'failing_edit.sh', 'echo error >&2\nexit 3\n')
+    veil_auth = make_auth_class(scripts)
+    result = await veil_auth.user_lock(username='user', capture_stderr=False)
+    assert (result.return_code, result.error_msg, result.success) == (3, None, False)
+
+
+@pytest.mark.asyncio
+async def test_user_edit_arguments(auth_class, scripts):
+    """_user_edit passes every set value with its flag."""
+    result = await auth_class._user_edit(username='user', group_add='vdi', lock=True,
+                                         gecos='Имя', expire_date='2030-01-01',
+                                         inactive_period=5)
+    assert result.success
+    assert read_lines(scripts['user_edit'] + '.args') == ['-u', 'user', '-a', 'vdi', '-L',
+                                                          '-c', 'Имя', '-e', '2030-01-01',
+                                                          '-f', '5']
+    with pytest.raises(ValueError) as exc_info:
+        await auth_class._user_edit(username='user')
+    assert str(exc_info.value) == 'No new arguments.'
+
+
+@pytest.mark.asyncio
+async def test_commands_without_close_fds(scripts):
+    """Commands run with close_fds=False too."""
+    veil_auth = make_auth_class(scripts, close_fds=False)
+    assert (await veil_auth.user_create(username='user')).success
+    assert read_lines(scripts['user_add'] + '.args') == ['-u', 'user']
+
+
+@pytest.mark.asyncio
+async def test_user_in_group_nss(scripts):
+    """NSS check does not run the check script, unknown names are not members."""
+    user = pwd.getpwuid(os.getuid())
+    group = grp.getgrgid(user.pw_gid).gr_name
+    veil_auth = make_auth_class(scripts, nss_group_check=True, group_cache_ttl=0)
+    assert await veil_auth.user_in_group(username=user.pw_name, group=group)
+    assert not await veil_auth.user_in_group(username=user.pw_name, group='no-such-group')
+    assert not await veil_auth.user_in_group(username='no-such-user', group=group)
+    assert group_check_calls(scripts) == 0
@@ -2,21 +2,132 @@
 """VeiL asyncio linux authentication utils."""
 
 import asyncio
-import shlex
+import functools
+import grp
+import os
+import pwd
+import re
 import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Sequence, Union
 
 try:
     import pam
 except ImportError:  # pragma: no cover
     pam = None
 
+try:
+    import async_timeout
+except ImportError:  # pragma: no cover
+    async_timeout = None
+
+# POSIX user and group names: no `:`/`,` (passwd and group list separators), no spaces
+# and no leading `-`.
+_NAME_ARG = re.compile(r'\A[A-Za-z0-9_][A-Za-z0-9_.-]{0,31}\Z')
+# GECOS: letters, digits, spaces, `,` (GECOS fields separator) and a few punctuation marks.
+_GECOS_ARG = re.compile(r'\A[\w @.,/+=-]+\Z')
+_DATE_ARG = re.compile(r'\A[0-9]{4}-[0-9]{2}-[0-9]{2}\Z')
+_DAYS_ARG = re.compile(r'\A(?:-1|[0-9]+)\Z')
+# chpasswd takes everything after the first `:` of a line, so any single line is fine.
+_PASSWORD_ARG = re.compile(r'\A[^\n]+\Z')
+# bi-scripts flags and patterns of their values (None if flag has no value).
+_CMD_FLAGS = {'-u': _NAME_ARG, '-g': _NAME_ARG, '-a': _NAME_ARG, '-c': _GECOS_ARG,
+              '-G': _GECOS_ARG, '-e': _DATE_ARG, '-f': _DAYS_ARG, '-p': _PASSWORD_ARG,
+              '-s': None, '-L': None, '-U': None}
+
+
+def _check_cmd_args(cmd_args: Sequence[str]):
+    """Check that cmd_args are known flags followed by values of the flag pattern.
+
+    Error messages contain argument positions only, values may be passwords.
+    """
+    value_pattern = None
+    for position, arg in enumerate(cmd_args):
+        if not isinstance(arg, str):
+            valid = False
+        elif value_pattern is None:
+            valid = arg in _CMD_FLAGS
+            value_pattern = _CMD_FLAGS.get(arg)
+        else:
+            valid = value_pattern.match(arg)
+            value_pattern = None
+        if not valid:
+            raise ValueError('Unsafe command argument at position {}.'.format(position))
+    if value_pattern is not None:
+        raise ValueError('Value of the last command argument is missing.')
+
+
+# Timeout context managers do not wrap the awaitable into an extra Task like wait_for.
+if hasattr(asyncio, 'timeout'):
+    _timeout = asyncio.timeout
+elif async_timeout is not None:  # pragma: no cover
+    _timeout = async_timeout.timeout
+else:  # pragma: no cover
+    _timeout = None
+
+if _timeout is not None:
+    async def _wait_for(aw, timeout):
+        """Wait for the awaitable within a timeout context."""
+        async with _timeout(timeout):
+            return await aw
+else:  # pragma: no cover
+    _wait_for = asyncio.wait_for
+
+# Python < 3.7 has no get_running_loop, get_event_loop returns the running loop there.
+_get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+# Seconds to wait for a timed out proc exit after a signal.
+_STOP_TIMEOUT = 10
+
+
+def _password_line(password: str) -> bytes:
+    """Prepare password for a bi-script stdin (`-s` flag)."""
+    if not isinstance(password, str) or not _PASSWORD_ARG.match(password):
+        raise ValueError('Password should be a non-empty single line str.')
+    return (password + '\n').encode()
+
+
+def _check_membership(username: str, group: str) -> bool:
+    """Check that user in a group with NSS (no process spawn)."""
+    try:
+        group_gid = grp.getgrnam(group).gr_gid
+        user_gid = pwd.getpwnam(username).pw_gid
+    except KeyError:
+        return False
+    return group_gid in os.getgrouplist(username, user_gid)
+
+
+async def _read_stderr(proc: asyncio.subprocess.Process) -> Optional[bytes]:
+    """Read proc stderr (if piped) and wait for proc exit."""
+    stderr = await proc.stderr.read() if proc.stderr else None
+    await proc.wait()
+    return stderr
+
+
+@functools.lru_cache(maxsize=64)
+def _validate_cmd_path(path: str) -> str:
+    """Check that path is a user executable file with a single stat call."""
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        mode = 0
+    if not stat.S_ISREG(mode):
+        raise FileExistsError('{file_path} is not a file.'.format(file_path=path))
+    if not mode & stat.S_IXUSR:
+        raise PermissionError('{file_path} can`t be executed by user.'.format(file_path=path))  # noqa: E501
+    return path
+
 
 class CommandType:
     """Descriptor for command type checking.
 
-    Command path must be a executable file.
+    Command path must be a executable file, optional command can also be empty (None).
+    Value is stored in the instance slot named like the attribute with a single leading
+    underscore (`__SUDO_CMD` -> `_SUDO_CMD`).
     """
 
     @staticmethod
@@ -31,36 +142,27 @@ class CommandType:
         st = filepath.stat()
         return bool(st.st_mode & stat.S_IRUSR)
 
-    def __init__(self, name):
+    def __init__(self, name, optional: bool = False):
         """Set attribute name and checking value type."""
         self.name = name
+        self.slot_name = '_' + name.lstrip('_')
         self.value_type = str
+        self.optional = optional
 
     def __set__(self, instance, value):
-        """Check that attribute value type equals value_type."""
+        """Check that attribute value type equals value_type (or None if optional)."""
+        if self.optional and not value:
+            setattr(instance, self.slot_name, None)
+            return
         if not isinstance(value, self.value_type):
             raise TypeError('{val} is not a {val_type}'.format(val=value, val_type=self.value_type))  # noqa: E501
-        value = Path(value)
-        if not value.is_file():
-            raise FileExistsError('{file_path} is not a file.'.format(file_path=value))
-        if not self.user_executable(value):
-            raise PermissionError('{file_path} can`t be executed by user.'.format(file_path=value))  # noqa: E501
-        instance.__dict__[self.name] = str(value)
+        setattr(instance, self.slot_name, _validate_cmd_path(value))
 
     def __get__(self, instance, class_) -> str:
         """Return attribute value."""
-        return instance.__dict__[self.name]
-
-
-class OptionalCommandType(CommandType):
-    """Descriptor for nullable shell command."""
-
-    def __set__(self, instance, value):
-        """Check that attribute value type equals value_type or None."""
-        if not value:
-            instance.__dict__[self.name] = None
-        else:
-            super().__set__(instance=instance, value=value)
+        if instance is None:
+            return self
+        return getattr(instance, self.slot_name)
 
 
 class VeilResult:
@@ -70,18 +172,44 @@ class VeilResult:
         return_code: all instead of 0 is an error.
         error_msg: stderr value.
         stdout_msg: stdout value.
+
+    Attributes are read-only: successful results without output are a shared object.
+    Raw proc output (bytes) is decoded on the first error_msg/stdout_msg access.
     """
 
-    def __init__(self, return_code: int, error_msg: str, stdout_msg: str):
+    __slots__ = ('_return_code', '_error_msg', '_stdout_msg')
+
+    def __init__(self, return_code: int,
+                 error_msg: Optional[Union[str, bytes]],
+                 stdout_msg: Optional[Union[str, bytes]]):
         """Please see help(VeilResult) for more info."""
-        self.return_code = return_code
-        self.error_msg = error_msg
-        self.stdout_msg = stdout_msg
+        self._return_code = return_code
+        self._error_msg = error_msg
+        self._stdout_msg = stdout_msg
+
+    @property
+    def return_code(self) -> int:
+        """Command return code."""
+        return self._return_code
+
+    @property
+    def error_msg(self) -> Optional[str]:
+        """Decoded stderr value."""
+        if isinstance(self._error_msg, bytes):
+            self._error_msg = self._error_msg.decode()
+        return self._error_msg or None
+
+    @property
+    def stdout_msg(self) -> Optional[str]:
+        """Decoded stdout value."""
+        if isinstance(self._stdout_msg, bytes):
+            self._stdout_msg = self._stdout_msg.decode()
+        return self._stdout_msg or None
 
     @property
     def success(self):
         """If no information about errors - operation result is success."""
-        return bool(self.return_code == 0 and not self.error_msg)
+        return bool(self.return_code == 0 and not self._error_msg)
 
     def __str__(self):
         """Object print prettify."""
@@ -91,6 +219,10 @@ class VeilResult:
             return 'return code: {}, msg: {}'.format(self.return_code, self.error_msg)
 
 
+# Shared result of a successful operation without any output.
+_OK_RESULT = VeilResult(return_code=0, error_msg=None, stdout_msg=None)
+
+
 class VeilAuthPam:
     """VeilClient class.
 
@@ -101,11 +233,22 @@ class VeilAuthPam:
         __USER_SET_PASS_CMD: str with validated Path to executable command.
         __USER_CHECK_IN_GROUP_CMD: str with validated Path to executable command.
         __USER_REMOVE_GROUP_CMD: str with validated Path to executable command.
+        __USER_CREATE_NEW_CMD: str with validated Path to executable command (Can be null).
         __SUDO_CMD: str with validated Path to executable command (Can be null).
         __KILL_CMD: str with validated Path to executable command (Can be null).
         __validate: do or not command extra validation.
         __task_timeout = timeout for asyncio.wait_for.
         __show_stdout = show proc stdout or not (DEV_NULL if not).
+        __group_cache_ttl = user_in_group results lifetime in seconds.
+        __group_cache = {(username, group): (result, expire time)} cache.
+        __pam_pool = ThreadPoolExecutor for libpam authentication.
+        __pam_local = threading.local with a pam.pam() object of each pool thread.
+        __password_stdin = pass passwords via proc stdin or not.
+        __close_fds = close inherited file descriptors in child processes or not.
+        __nss_group_check = check group membership with NSS or with user_check_in_group_cmd.
+        __sudo_prefix = (__SUDO_CMD,) if commands should be with sudo prefix else ().
+        __allowed_cmds = frozenset of all defined commands, only they can be executed.
+        __CMD_ATTRS = names of all command attributes.
 
     Attributes:
         user_add_cmd: path to executable command on local fs for user create (`adduser`)
@@ -122,6 +265,19 @@ class VeilAuthPam:
         show_stdout: show proc stdout or not. Default is False.
         sudo_cmd: nullable path to executable command on local fs for sudo (`sudo`).
         kill_cmd: nullable path to executable command on local fs for kill command (`kill`).
+        user_create_new_cmd: nullable path to executable command on local fs for user
+            create and password set in a single call (`adduser` + `chpasswd`).
+        group_cache_ttl: seconds to keep user_in_group results. Default is 60 sec,
+            0 or None disables the cache.
+        pam_workers: number of threads for libpam authentication. Default is 4.
+        password_stdin: pass passwords to user_set_pass_cmd and user_create_new_cmd via
+            stdin (`-s` flag) instead of argv. Default is False.
+        close_fds: close inherited file descriptors before command exec. Default is True.
+            False lets CPython (3.8+) start commands with posix_spawn instead of fork and
+            an O(fds) close loop, but requires caller fd hygiene: every inheritable fd of
+            the process leaks to the commands (fds created by Python are non-inheritable).
+        nss_group_check: user_in_group reads membership with NSS (getgrnam, getgrouplist)
+            without a process spawn. False runs user_check_in_group_cmd. Default is True.
     """
 
     __USER_ADD_CMD = CommandType('__USER_ADD_CMD')
@@ -130,8 +286,23 @@ class VeilAuthPam:
     __USER_SET_PASS_CMD = CommandType('__USER_SET_PASS_CMD')
     __USER_CHECK_IN_GROUP_CMD = CommandType('__USER_CHECK_IN_GROUP_CMD')
     __USER_REMOVE_GROUP_CMD = CommandType('__USER_REMOVE_GROUP_CMD')
-    __SUDO_CMD = OptionalCommandType('__SUDO_CMD')
-    __KILL_CMD = OptionalCommandType('__KILL_CMD')
+    __SUDO_CMD = CommandType('__SUDO_CMD', optional=True)
+    __KILL_CMD = CommandType('__KILL_CMD', optional=True)
+    __USER_CREATE_NEW_CMD = CommandType('__USER_CREATE_NEW_CMD', optional=True)
+    __GROUP_CACHE_SIZE = 4096
+    __CMD_ATTRS = ('_VeilAuthPam__USER_ADD_CMD', '_VeilAuthPam__GROUP_ADD_CMD',
+                   '_VeilAuthPam__USER_EDIT_CMD', '_VeilAuthPam__USER_SET_PASS_CMD',
+                   '_VeilAuthPam__USER_CHECK_IN_GROUP_CMD',
+                   '_VeilAuthPam__USER_REMOVE_GROUP_CMD',
+                   '_VeilAuthPam__USER_CREATE_NEW_CMD', '_VeilAuthPam__SUDO_CMD',
+                   '_VeilAuthPam__KILL_CMD')
+
+    __slots__ = ('_USER_ADD_CMD', '_GROUP_ADD_CMD', '_USER_EDIT_CMD', '_USER_SET_PASS_CMD',
+                 '_USER_CHECK_IN_GROUP_CMD', '_USER_REMOVE_GROUP_CMD', '_SUDO_CMD',
+                 '_KILL_CMD', '_USER_CREATE_NEW_CMD', '__sudo_prefix', '__task_timeout',
+                 '__validate', '__show_stdout', '__password_stdin', '__group_cache_ttl',
+                 '__group_cache', '__pam_pool', '__pam_local', '__allowed_cmds',
+                 '__close_fds', '__nss_group_check')
 
     def __init__(self, user_add_cmd: str,
                  group_add_cmd: str,
@@ -143,7 +314,13 @@ class VeilAuthPam:
                  validate: Optional[bool] = True,
                  show_stdout: Optional[bool] = False,
                  sudo_cmd: Optional[str] = None,
-                 kill_cmd: Optional[str] = None):
+                 kill_cmd: Optional[str] = None,
+                 group_cache_ttl: Optional[int] = 60,
+                 pam_workers: Optional[int] = 4,
+                 user_create_new_cmd: Optional[str] = None,
+                 password_stdin: Optional[bool] = False,
+                 close_fds: Optional[bool] = True,
+                 nss_group_check: Optional[bool] = True):
         """Please see help(VeilAuthPam) for more info."""
         # Commands
         self.__USER_ADD_CMD = user_add_cmd
@@ -154,102 +331,135 @@ class VeilAuthPam:
         self.__USER_REMOVE_GROUP_CMD = user_remove_group_cmd
         self.__SUDO_CMD = sudo_cmd
         self.__KILL_CMD = kill_cmd
+        self.__USER_CREATE_NEW_CMD = user_create_new_cmd
+        if self.__SUDO_CMD and not self.__KILL_CMD:
+            raise AssertionError('Define a `kill_cmd`, otherwise created processes may be not closed.')  # noqa: E501
+        self.__sudo_prefix = (self.__SUDO_CMD,) if self.__SUDO_CMD else ()
         # Additional
         self.__task_timeout = task_timeout
         self.__validate = validate
         self.__show_stdout = show_stdout
+        self.__password_stdin = password_stdin
+        self.__close_fds = close_fds
+        self.__nss_group_check = nss_group_check
+        self.__group_cache_ttl = group_cache_ttl
+        self.__group_cache = dict()
+        pam_pool_kwargs = {'max_workers': pam_workers}
+        if sys.version_info >= (3, 6):
+            pam_pool_kwargs['thread_name_prefix'] = 'veil-pam'
+        self.__pam_pool = ThreadPoolExecutor(**pam_pool_kwargs)
+        self.__pam_local = threading.local()
+        self.__allowed_cmds = frozenset(getattr(self, attr)
+                                        for attr in self.__CMD_ATTRS) - {None}
+
+    def close(self):
+        """Release libpam authentication threads."""
+        self.__pam_pool.shutdown(wait=False)
 
     @property
     def as_sudo(self):
         """If __SUDO_CMD and __KILL_CMD is not null, commands should be with sudo prefix."""
-        if self.__SUDO_CMD and not self.__KILL_CMD:
-            raise AssertionError('Define a `kill_cmd`, otherwise created processes may be not closed.')  # noqa: E501
-        return bool(self.__SUDO_CMD and self.__KILL_CMD)
+        return bool(self.__sudo_prefix)
 
-    @property
-    def __possible_commands(self) -> set:
-        """Only pre-added commands."""
-        result_set = set()
-        for attr in dir(self):
-            if hasattr(self.__class__, attr) and callable(getattr(self.__class__, attr)):
-                continue
-            if attr.startswith('__') and attr.endswith('_CMD'):
-                result_set.add(self.__getattribute__(attr))
-        return result_set
+    def __validate_command(self, cmd: str):
+        """Check that cmd in __allowed_cmds set."""
+        if cmd not in self.__allowed_cmds:
+            raise ValueError('{c} execution denied. Try one of:{pc}'.format(c=cmd, pc=set(self.__allowed_cmds)))  # noqa: E501
 
-    async def __validate_command(self, cmd: str):
-        """Check that cmd in __possible_commands set."""
-        if not cmd:
-            raise ValueError('{c} should be not empty.')
-        if cmd not in self.__possible_commands:
-            raise ValueError('{c} execution denied. Try one of:{pc}'.format(c=cmd, pc=self.__possible_commands))  # noqa: E501
+    async def __stop_proc(self, proc: asyncio.subprocess.Process, as_sudo: bool):
+        """Stop timed out proc, every next signal is sent if proc ignores the previous one.
 
-    @staticmethod
-    async def __escape_command_args(cmd_args: list) -> list:
-        """Make shell-escaped cmd arguments."""
-        if not cmd_args or not isinstance(cmd_args, list):
-            raise ValueError('{c} should be not empty.')
-        cmd_args_str = ' '.join(cmd_args)
-        return shlex.split(cmd_args_str)
-
-    async def __run_cmd(self, cmd: str, cmd_args: List[str],
+        sudo relays SIGTERM to the command, so it is tried first, SIGKILL would leave
+        the command running. If proc can`t be signalled (it runs as another user),
+        kill_cmd is called via sudo instead.
+        """
+        signals = (proc.terminate, proc.kill) if as_sudo else (proc.kill,)
+        for send_signal in signals:
+            try:
+                send_signal()
+            except ProcessLookupError:
+                return
+            except PermissionError:
+                kill_argv = (*self.__sudo_prefix, self.__KILL_CMD, str(proc.pid))
+                kill_proc = await asyncio.create_subprocess_exec(
+                    *kill_argv,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    close_fds=self.__close_fds)
+                await kill_proc.wait()
+            try:
+                await _wait_for(proc.wait(), _STOP_TIMEOUT)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+    async def __run_cmd(self, cmd: str, cmd_args: Sequence[str],
                         show_stdout: Optional[bool] = None,
-                        as_sudo: Optional[bool] = None) -> VeilResult:
+                        as_sudo: Optional[bool] = None,
+                        capture_stderr: Optional[bool] = True,
+                        stdin_data: Optional[bytes] = None) -> VeilResult:
         """Create asyncio.subprocess with __task_timeout.
 
         cmd: should be a str value of VeilAuthPam.__*_CMD attribute.
-        cmd_args: list of cmd str arguments.
+        cmd_args: list or tuple of cmd str arguments.
+        capture_stderr: read proc stderr or not (DEV_NULL if not).
+        stdin_data: bytes that should be written to proc stdin.
+
+        Arguments note:
+            create_subprocess_exec does not start a shell, cmd_args are passed to execve
+            as is and are never re-tokenized here. Commands are site-defined scripts that
+            may build their own command line, so with validate every flag value is still
+            checked against the pattern of its flag (_CMD_FLAGS).
 
         proc.wait() note:
             This method can deadlock when using stdout=PIPE or stderr=PIPE and the child
             process generates so much output that it blocks waiting for the OS pipe
             buffer to accept more data. Use the communicate() method when using pipes to
-            avoid this condition.
+            avoid this condition. With a single stderr pipe (or none) _read_stderr reads
+            it to EOF before waiting, without communicate() helper tasks.
         """
         # Prepare arguments
         if as_sudo is None:
-            as_sudo = self.as_sudo
-        if as_sudo and not self.as_sudo:
+            as_sudo = bool(self.__sudo_prefix)
+        elif as_sudo and not self.__sudo_prefix:
             raise ValueError('Run as sudo activated, but sudo commands are empty.')
         if show_stdout is None:
             show_stdout = self.__show_stdout
 
         # validate
         if self.__validate:
-            await self.__validate_command(cmd=cmd)
-            cmd_args = await self.__escape_command_args(cmd_args=cmd_args)
-        if as_sudo:
-            cmd_args.insert(0, cmd)
-            cmd = self.__SUDO_CMD
+            if not cmd_args or not isinstance(cmd_args, (list, tuple)):
+                raise ValueError('cmd_args should be not empty.')
+            self.__validate_command(cmd=cmd)
+            _check_cmd_args(cmd_args)
+        argv = (*self.__sudo_prefix, cmd, *cmd_args) if as_sudo else (cmd, *cmd_args)
         # run subprocess
         try:
             stdout = asyncio.subprocess.PIPE if show_stdout else asyncio.subprocess.DEVNULL
-            proc = await asyncio.create_subprocess_exec(cmd, *cmd_args,
+            stderr = asyncio.subprocess.PIPE if capture_stderr else asyncio.subprocess.DEVNULL
+            stdin = asyncio.subprocess.PIPE if stdin_data is not None else None
+            proc = await asyncio.create_subprocess_exec(*argv,
+                                                        stdin=stdin,
                                                         stdout=stdout,
-                                                        stderr=asyncio.subprocess.PIPE,
-                                                        limit=1000)
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), self.__task_timeout)
+                                                        stderr=stderr,
+                                                        close_fds=self.__close_fds)
+            if show_stdout or stdin_data is not None:
+                stdout, stderr = await _wait_for(proc.communicate(input=stdin_data),
+                                                 self.__task_timeout)
+            else:
+                stdout, stderr = None, await _wait_for(_read_stderr(proc), self.__task_timeout)
 
             return_code = proc.returncode
         except asyncio.TimeoutError:
             return_code = 1
             stderr = None
             stdout = None
-            if as_sudo:
-                kill_cmd_args = [self.__KILL_CMD, str(proc.pid)]
-                kill_proc = await asyncio.create_subprocess_exec(cmd, *kill_cmd_args,
-                                                                 stdout=asyncio.subprocess.DEVNULL,  # noqa: E501
-                                                                 stderr=asyncio.subprocess.DEVNULL,  # noqa: E501
-                                                                 limit=50)  # noqa: E501
-                await kill_proc.wait()
-            else:
-                proc.kill()
-                await asyncio.wait_for(proc.wait(), 10)
+            await self.__stop_proc(proc, as_sudo)
         # prepare VeilResult
-        error_msg = stderr.decode() if stderr else None
-        stdout_msg = stdout.decode() if stdout else None
+        if return_code == 0 and not stderr and not stdout:
+            return _OK_RESULT
         return_code = 1 if return_code == 0 and stderr else return_code
-        return VeilResult(return_code=return_code, error_msg=error_msg, stdout_msg=stdout_msg)
+        return VeilResult(return_code=return_code, error_msg=stderr, stdout_msg=stdout)
 
     async def _user_edit(self, username: str, group_add: Optional[str] = None,
                          lock: Optional[bool] = False, unlock: Optional[bool] = False,
@@ -257,7 +467,8 @@ class VeilAuthPam:
                          expire_date: Optional[str] = None,
                          inactive_period: Optional[int] = None,
                          show_stdout: Optional[bool] = None,
-                         as_sudo: Optional[bool] = None
+                         as_sudo: Optional[bool] = None,
+                         capture_stderr: Optional[bool] = True
                          ) -> VeilResult:
         """Modify user attributes.
 
@@ -273,29 +484,26 @@ class VeilAuthPam:
                 permanently disabled.
             show_stdout: redefine the class show_stdout argument.
             as_sudo: redefine the class as_sudo argument
+            capture_stderr: read command stderr or not. bi-scripts exit with the command
+                return code, so without stderr the result is checked by return code only.
         """
-        # Prepare and validate command arguments
+        # Prepare command arguments, values are validated in __run_cmd
         cmd_args = ['-u', username]
-        if group_add and isinstance(group_add, str):
-            cmd_args.append('-a {}'.format(group_add))
-        if lock and isinstance(lock, bool):
-            cmd_args.append('-L')
-        if unlock and isinstance(unlock, bool):
-            cmd_args.append('-U')
-        if gecos and isinstance(gecos, str):
-            # TODO: chfn: name with non-ASCII characters: 'фамилия имя'
-            cmd_args.append('-c {}'.format(gecos))
-        if expire_date and isinstance(expire_date, str):
-            cmd_args.append('-e {}'.format(expire_date))
-        if inactive_period and isinstance(inactive_period, int):
-            cmd_args.append('-f {}'.format(inactive_period))
+        cmd_args += ('-a', group_add) if group_add else ()
+        cmd_args += ('-L',) if lock else ()
+        cmd_args += ('-U',) if unlock else ()
+        # TODO: chfn: name with non-ASCII characters: 'фамилия имя'
+        cmd_args += ('-c', gecos) if gecos else ()
+        cmd_args += ('-e', expire_date) if expire_date else ()
+        cmd_args += ('-f', str(inactive_period)) if inactive_period else ()
         if len(cmd_args) <= 2:
             raise ValueError('No new arguments.')
         # Execute command
         return await self.__run_cmd(cmd=self.__USER_EDIT_CMD,
                                     cmd_args=cmd_args,
                                     show_stdout=show_stdout,
-                                    as_sudo=as_sudo)
+                                    as_sudo=as_sudo,
+                                    capture_stderr=capture_stderr)
 
     async def user_create(self, username: str,
                           group: Optional[str] = None,
@@ -313,14 +521,17 @@ class VeilAuthPam:
         """
         cmd_args = ['-u', username]
         if group and isinstance(group, str):
-            cmd_args.append('-g {}'.format(group))
+            cmd_args.extend(('-g', group))
         if gecos and isinstance(gecos, str):
             # TODO: chfn: name with non-ASCII characters: 'фамилия имя'
-            cmd_args.append('-G {}'.format(gecos))
-        return await self.__run_cmd(cmd=self.__USER_ADD_CMD,
-                                    cmd_args=cmd_args,
-                                    show_stdout=show_stdout,
-                                    as_sudo=as_sudo)
+            cmd_args.extend(('-G', gecos))
+        try:
+            return await self.__run_cmd(cmd=self.__USER_ADD_CMD,
+                                        cmd_args=cmd_args,
+                                        show_stdout=show_stdout,
+                                        as_sudo=as_sudo)
+        finally:
+            self.__group_cache.pop((username, group), None)
 
     async def user_set_password(self, username: str, new_password: str,
                                 show_stdout: Optional[bool] = None,
@@ -333,7 +544,13 @@ class VeilAuthPam:
             show_stdout: redefine the class show_stdout argument.
             as_sudo: redefine the class as_sudo argument.
         """
-        cmd_args = ['-u', username, '-p', new_password]
+        if self.__password_stdin:
+            return await self.__run_cmd(cmd=self.__USER_SET_PASS_CMD,
+                                        cmd_args=('-u', username, '-s'),
+                                        show_stdout=show_stdout,
+                                        as_sudo=as_sudo,
+                                        stdin_data=_password_line(new_password))
+        cmd_args = ('-u', username, '-p', new_password)
         return await self.__run_cmd(cmd=self.__USER_SET_PASS_CMD,
                                     cmd_args=cmd_args,
                                     show_stdout=show_stdout,
@@ -355,8 +572,34 @@ class VeilAuthPam:
             show_stdout: redefine the class show_stdout argument.
             as_sudo: redefine the class as_sudo argument.
 
+        If user_create_new_cmd is defined - both steps are done by a single command call,
+        its return code 96 means that password set failed.
         If return code 969 - user is created, but password set return error.
         """
+        if self.__USER_CREATE_NEW_CMD:
+            stdin_data = None
+            if self.__password_stdin:
+                cmd_args = ['-u', username, '-s']
+                stdin_data = _password_line(password)
+            else:
+                cmd_args = ['-u', username, '-p', password]
+            if group and isinstance(group, str):
+                cmd_args.extend(('-g', group))
+            if gecos and isinstance(gecos, str):
+                cmd_args.extend(('-G', gecos))
+            try:
+                create_result = await self.__run_cmd(cmd=self.__USER_CREATE_NEW_CMD,
+                                                     cmd_args=cmd_args,
+                                                     show_stdout=show_stdout,
+                                                     as_sudo=as_sudo,
+                                                     stdin_data=stdin_data)
+            finally:
+                self.__group_cache.pop((username, group), None)
+            if create_result.return_code == 96:
+                return VeilResult(return_code=969,
+                                  error_msg=create_result.error_msg,
+                                  stdout_msg=None)
+            return create_result
         user_result = await self.user_create(username=username,
                                              group=group,
                                              gecos=gecos,
@@ -373,7 +616,35 @@ class VeilAuthPam:
             return VeilResult(return_code=969,
                               error_msg=password_result.error_msg,
                               stdout_msg=None)
-        return VeilResult(return_code=0, error_msg=None, stdout_msg=None)
+        return _OK_RESULT
+
+    async def users_create_new(self, users: List[dict],
+                               max_concurrency: int = 4) -> list:
+        """Interface for creating many new users concurrently.
+
+        Every user is created by user_create_new, at most max_concurrency at once.
+
+        Arguments:
+            users: list of user_create_new keyword arguments, like
+                {'username': 'user1', 'password': 'qwe123', 'group': 'vdi-users'}.
+            max_concurrency: max number of simultaneously created users. adduser and
+                chpasswd lock /etc/passwd, so big values give nothing.
+
+        Results are in the users order, return codes are the same as for user_create_new.
+        Raised exceptions are returned instead of results (like asyncio.gather does).
+        """
+        # Semaphore(0) would never let a command start.
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            raise ValueError('max_concurrency should be a positive int.')
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def create_new(user_kwargs: dict) -> VeilResult:
+            async with semaphore:
+                return await self.user_create_new(**user_kwargs)
+
+        results = await asyncio.gather(*[create_new(user_kwargs) for user_kwargs in users],
+                                       return_exceptions=True)
+        return list(results)
 
     async def user_set_gecos(self, username: str, gecos: str,
                              show_stdout: Optional[bool] = None,
@@ -388,77 +659,123 @@ class VeilAuthPam:
                              show_stdout: Optional[bool] = None,
                              as_sudo: Optional[bool] = None) -> VeilResult:
         """Add to a user additional group."""
-        return await self._user_edit(username=username,
-                                     group_add=group,
-                                     show_stdout=show_stdout,
-                                     as_sudo=as_sudo)
+        try:
+            return await self._user_edit(username=username,
+                                         group_add=group,
+                                         show_stdout=show_stdout,
+                                         as_sudo=as_sudo)
+        finally:
+            self.__group_cache.pop((username, group), None)
 
     async def user_lock(self, username: str,
                         show_stdout: Optional[bool] = None,
-                        as_sudo: Optional[bool] = None) -> VeilResult:
+                        as_sudo: Optional[bool] = None,
+                        capture_stderr: Optional[bool] = True) -> VeilResult:
         """Lock a user with the given username."""
         return await self._user_edit(username=username,
                                      lock=True,
                                      show_stdout=show_stdout,
-                                     as_sudo=as_sudo)
+                                     as_sudo=as_sudo,
+                                     capture_stderr=capture_stderr)
 
     async def user_unlock(self, username: str,
                           show_stdout: Optional[bool] = None,
-                          as_sudo: Optional[bool] = None) -> VeilResult:
+                          as_sudo: Optional[bool] = None,
+                          capture_stderr: Optional[bool] = True) -> VeilResult:
         """Unlock a user with the given username."""
         return await self._user_edit(username=username,
                                      unlock=True,
                                      show_stdout=show_stdout,
-                                     as_sudo=as_sudo)
+                                     as_sudo=as_sudo,
+                                     capture_stderr=capture_stderr)
 
     async def user_remove_group(self, username: str, group: str,
                                 show_stdout: Optional[bool] = None,
-                                as_sudo: Optional[bool] = None) -> VeilResult:
+                                as_sudo: Optional[bool] = None,
+                                capture_stderr: Optional[bool] = True) -> VeilResult:
         """Remove existing user from a group members."""
-        cmd_args = ['-u', username, '-g', group]
-        return await self.__run_cmd(cmd=self.__USER_REMOVE_GROUP_CMD,
-                                    cmd_args=cmd_args,
-                                    show_stdout=show_stdout,
-                                    as_sudo=as_sudo)
+        cmd_args = ('-u', username, '-g', group)
+        try:
+            return await self.__run_cmd(cmd=self.__USER_REMOVE_GROUP_CMD,
+                                        cmd_args=cmd_args,
+                                        show_stdout=show_stdout,
+                                        as_sudo=as_sudo,
+                                        capture_stderr=capture_stderr)
+        finally:
+            self.__group_cache.pop((username, group), None)
 
     async def user_in_group(self, username: str, group: str,
                             as_sudo: Optional[bool] = None) -> bool:
-        """Check that user in a group."""
-        cmd_args = ['-u', username, '-g', group]
-        check_result = await self.__run_cmd(cmd=self.__USER_CHECK_IN_GROUP_CMD,
-                                            cmd_args=cmd_args,
-                                            show_stdout=True,
-                                            as_sudo=as_sudo)
-        if check_result.success and check_result.stdout_msg.strip() != '0':
-            return True
-        return False
+        """Check that user in a group.
+
+        With nss_group_check membership is read from NSS in the default executor
+        and as_sudo is ignored, otherwise user_check_in_group_cmd is executed.
+        Successful checks are cached for group_cache_ttl seconds. Cached value is dropped
+        when user_add_group, user_remove_group, user_create or user_create_new of the
+        same instance with this username and group finishes.
+        """
+        cache_key = (username, group)
+        if self.__group_cache_ttl:
+            cached = self.__group_cache.get(cache_key)
+            if cached and cached[1] > time.monotonic():
+                return cached[0]
+        if self.__nss_group_check:
+            future = _get_running_loop().run_in_executor(None, _check_membership,
+                                                         username, group)
+            try:
+                in_group = await _wait_for(future, self.__task_timeout)
+            except asyncio.TimeoutError:
+                return False
+        else:
+            cmd_args = ('-u', username, '-g', group)
+            check_result = await self.__run_cmd(cmd=self.__USER_CHECK_IN_GROUP_CMD,
+                                                cmd_args=cmd_args,
+                                                show_stdout=True,
+                                                as_sudo=as_sudo,
+                                                capture_stderr=False)
+            if not check_result.success:
+                return False
+            stdout_msg = check_result.stdout_msg
+            in_group = bool(stdout_msg and stdout_msg.strip() != '0')
+        if self.__group_cache_ttl:
+            if len(self.__group_cache) >= self.__GROUP_CACHE_SIZE:
+                self.__group_cache.clear()
+            self.__group_cache[cache_key] = (in_group,
+                                             time.monotonic() + self.__group_cache_ttl)
+        return in_group
 
     async def group_create(self, group: str,
                            show_stdout: Optional[bool] = None,
-                           as_sudo: Optional[bool] = None) -> VeilResult:
+                           as_sudo: Optional[bool] = None,
+                           capture_stderr: Optional[bool] = True) -> VeilResult:
         """Create new group."""
-        cmd_args = ['-g', group]
+        cmd_args = ('-g', group)
         return await self.__run_cmd(cmd=self.__GROUP_ADD_CMD,
                                     cmd_args=cmd_args,
                                     show_stdout=show_stdout,
-                                    as_sudo=as_sudo)
+                                    as_sudo=as_sudo,
+                                    capture_stderr=capture_stderr)
+
+    def __pam_authenticate(self, username: str, password: str) -> tuple:
+        """Authenticate with a pam.pam() object of the current pool thread."""
+        pam_obj = getattr(self.__pam_local, 'pam', None)
+        if pam_obj is None:
+            pam_obj = self.__pam_local.pam = pam.pam()
+        result = pam_obj.authenticate(username, password)
+        return result, pam_obj.code, pam_obj.reason
 
     async def user_authenticate(self, username: str, password: str) -> VeilResult:
         """Run system authentication method via libpam."""
         if pam is None:
             raise RuntimeError('Please install `python-pam`')  # pragma: no cover
-        __PAM = pam.pam()
-        loop = asyncio.get_event_loop()
-        aio_task = asyncio.ensure_future(loop.run_in_executor(None,
-                                                              __PAM.authenticate,
-                                                              username,
-                                                              password))
+        loop = _get_running_loop()
+        future = loop.run_in_executor(self.__pam_pool, self.__pam_authenticate,
+                                      username, password)
         try:
-            result = await asyncio.wait_for(aio_task, timeout=self.__task_timeout)
+            result, return_code, reason = await _wait_for(future, self.__task_timeout)
         except asyncio.TimeoutError:
-            result = False
+            result, return_code, reason = False, 1, 'Authentication timeout.'
         # prepare VeilResult
-        stdout_msg = __PAM.reason if result else None
-        error_msg = __PAM.reason if not result else None
-        return_code = __PAM.code
+        stdout_msg = reason if result else None
+        error_msg = reason if not result else None
         return VeilResult(return_code=return_code, error_msg=error_msg, stdout_msg=stdout_msg)